@@ -1,14 +1,39 @@
+import orjson
 import pymongo
-from flask import Flask, jsonify, request
+from cachetools import TTLCache
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask.json.provider import JSONProvider
 from bson.objectid import ObjectId
 from datetime import datetime, timedelta
+import functools
 import os
+import re
+import threading
+import time
 import yaml
 
+class OrJsonProvider(JSONProvider):
+    """
+    使用orjson进行JSON序列化，比标准库json快数倍。
+    OPT_NON_STR_KEYS允许整数作为键；无法识别的类型（如ObjectId）回退为str()。
+    """
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrJsonProvider(app)
 
 
 DOCKER_PORT = 5000  # 暴露的端口，保持不变
+# 尝试从环境变量获取MONGO_HOST，如果不存在，则使用'oj-mongo'；只在启动时解析一次
+MONGO_HOST = os.environ.get('MONGO_HOST', 'oj-mongo')
+MONGO_PORT = int(os.environ.get('MONGO_PORT', '27017')) # 显式转换为整数，处理可能缺失的情况
+
+# 优先使用libyaml的C实现，未编译C扩展时回退到纯Python实现
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 def format_datetime(dt):
     """将datetime对象格式化为MySQL能识别的字符串"""
@@ -17,27 +42,247 @@ def format_datetime(dt):
         return dt.strftime('%Y-%m-%d %H:%M:%S')
     return dt
 
+def mongo_format_datetime(field):
+    """format_datetime的聚合表达式版本，由MongoDB在服务端完成格式化；字段不存在时为null"""
+    return {'$dateToString': {'date': field, 'format': '%Y-%m-%d %H:%M:%S', 'timezone': '+08:00'}}
+
+def mongo_join(field):
+    """聚合表达式：将数组字段转换为逗号分隔的字符串，字段不存在时为空字符串"""
+    return {'$reduce': {
+        'input': {'$ifNull': [field, []]},
+        'initialValue': '',
+        'in': {'$concat': ['$$value', {'$cond': [{'$eq': ['$$value', '']}, '', ',']}, {'$toString': '$$this'}]}
+    }}
+
+# 流式返回时每批从MongoDB取回的文档数（默认101条一批，getMore往返过多）
+STREAM_BATCH_SIZE = 1000
+
+_EMPTY = object()
+
+# 参数格式校验，先用正则判断，避免对非法输入走异常处理流程
+OID_RE = re.compile(r'[0-9a-fA-F]{24}') # 24位十六进制的ObjectId字符串
+INT_RE = re.compile(r'[0-9]{1,18}') # 非负整数，18位以内保证不超出MongoDB的int64范围
+MAX_INT_ID = 10 ** 18 # 与INT_RE一致：JSON请求体中的整数id必须小于该值
+# 批量接口单次请求最多包含的id数量，避免$in条件过大超出BSON文档大小限制
+BULK_MAX_ITEMS = 10000
+
+def stream_json(rows):
+    """
+    将rows（可迭代对象，通常是包装了游标的生成器）以JSON数组的形式流式返回，
+    不在内存中拼出完整的结果列表。
+    第一个元素在返回Response之前取出，这样查询本身的错误（如连接失败）仍能由调用方返回500。
+    """
+    rows = iter(rows)
+    first = next(rows, _EMPTY)
+
+    def generate():
+        if first is _EMPTY:
+            yield '[]'
+            return
+        yield '[' + app.json.dumps(first)
+        for row in rows:
+            yield ',' + app.json.dumps(row)
+        yield ']'
+
+    return Response(stream_with_context(generate()), status=200, mimetype='application/json')
+
+# 比赛期间很少变化的接口允许客户端/代理缓存的秒数
+RESPONSE_MAX_AGE = 30
+
+def cached_json(result):
+    """
+    返回带ETag和Cache-Control的JSON响应。
+    客户端携带的If-None-Match与ETag一致时返回304，不再重复传输数据。
+    """
+    response = jsonify(result)
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = RESPONSE_MAX_AGE
+    return response.make_conditional(request)
+
+def load_config(config_file="config.yaml"):
+    """
+    尝试从文件中加载配置。
+    在模块导入时执行一次，以便在创建MongoDB客户端之前应用配置中的mongo_host。
+    """
+    global DOCKER_PORT, MONGO_HOST
+    if os.path.exists(config_file):
+        try:
+            with open(config_file, 'r') as f:
+                config = yaml.load(f, Loader=YAML_LOADER)
+                if config: # 检查config是否为空
+                    # 更新MONGO_HOST和DOCKER_PORT，如果配置文件中有
+                    MONGO_HOST = config.get('mongo_host', MONGO_HOST)
+                    DOCKER_PORT = config.get('docker_port', DOCKER_PORT)
+                    print(f"Using MONGO_HOST from {config_file}: {MONGO_HOST}")
+                    print(f"Using DOCKER_PORT from {config_file}: {DOCKER_PORT}")
+        except yaml.YAMLError as e:
+            print(f"Error reading config file {config_file}: {e}")
+            # 不终止程序，继续使用环境变量或默认值
+        except Exception as e:
+            print(f"An unexpected error occurred while reading config file: {e}")
+    else:
+        print(f"Config file {config_file} not found, using environment variables or defaults.")
+
+def create_mongo_client():
+    """
+    创建MongoDB客户端，使用启动时解析好的MONGO_HOST和MONGO_PORT。
+    connect=False 表示延迟到第一次真正的查询时才建立连接，避免在fork之前打开socket。
+    """
+    return pymongo.MongoClient(
+        host=MONGO_HOST,
+        port=MONGO_PORT,
+        maxPoolSize=50,
+        serverSelectionTimeoutMS=5000, #设置超时
+        connect=False
+    )
+
+load_config()
+# 整个进程共用一个客户端：PyMongo客户端是线程安全的，并自带连接池
+CLIENT = create_mongo_client()
+DB = CLIENT.hydro
+
 def get_mongo_client():
     """
     获取MongoDB客户端。
-    尝试从环境变量获取MONGO_HOST，如果不存在，则使用'oj-mongo'。
+    返回模块级共享的客户端，连接失败时由第一次查询抛出ConnectionFailure。
+    """
+    return CLIENT
+
+def reset_mongo_client():
+    """
+    重新创建MongoDB客户端。
+    供WSGI服务器（如gunicorn）在fork出worker进程后调用，避免多个进程共用同一组socket。
+    """
+    global CLIENT, DB
+    CLIENT = create_mongo_client()
+    DB = CLIENT.hydro
+
+# record查询使用的索引：与Hydro自身建立的索引相同，同时支持按_id排序分页
+RECORD_INDEX = [('domainId', 1), ('contest', 1), ('_id', -1)]
+# 比赛记录可能有数万条，加大每批取回的数量以减少getMore往返
+RECORD_BATCH_SIZE = 5000
+
+# user查询使用的索引：包含_id和uname，按_id查询uname时查询优化器可直接使用该索引完成覆盖查询，不必读取用户文档
+USER_INDEX = [('_id', 1), ('uname', 1)]
+
+# 与各接口的查询条件一一对应的索引，避免随着数据增长退化为全集合扫描
+INDEXES = [
+    ('document', [('domainId', 1), ('docType', 1), ('docId', 1)]),
+    ('record', RECORD_INDEX),
+    ('user.group', [('domainId', 1)]),
+    ('user', USER_INDEX),
+]
+
+# 连接MongoDB失败时，重试创建索引的间隔秒数
+INDEX_RETRY_INTERVAL = 60
+
+def ensure_indexes():
+    """
+    创建接口查询所需的索引。
+    索引已存在时create_index不会重复创建；Hydro自身已建立同键索引（名称或选项不同）或没有建索引权限时会报错，此时跳过即可。
+    连接失败时返回False，由调用方稍后重试。
+    """
+    for collection_name, keys in INDEXES:
+        try:
+            DB[collection_name].create_index(keys, background=True)
+        except pymongo.errors.OperationFailure as e:
+            print(f"Skipping index {keys} on {collection_name}: {e}")
+        except pymongo.errors.ConnectionFailure as e:
+            print(f"Failed to connect to MongoDB while creating indexes, retrying in {INDEX_RETRY_INTERVAL}s: {e}")
+            return False
+    print("MongoDB indexes ensured")
+    return True
+
+def start_ensure_indexes():
+    """
+    在后台线程中执行ensure_indexes，连接失败时每隔INDEX_RETRY_INTERVAL秒重试直到成功。
+    作为显式的启动步骤由gunicorn的post_worker_init（或直接运行app.py时）调用，不阻塞服务启动；
+    导入app（如backfill_score.py）时不会执行。
+    """
+    def run():
+        while not ensure_indexes():
+            time.sleep(INDEX_RETRY_INTERVAL)
+
+    threading.Thread(target=run, name='ensure-indexes', daemon=True).start()
+
+# 各接口查询使用的投影/聚合阶段，在模块加载时生成一次，不在每次请求中重复构造
+# 题目文档上预先计算的score是否仍有效：计算时的config（scoreConfig）与当前config一致
+SCORE_IS_FRESH = {'$eq': ['$scoreConfig', '$config']}
+PROJ_DOC30 = {'$project': {
+    '_id': {'$toString': '$_id'},
+    'docId': {'$toString': '$docId'}, # docId可能是ObjectId
+    'title': 1,
+    'beginAt': mongo_format_datetime('$beginAt'), # beginAt可能不存在
+    'pids': mongo_join('$pids') # pids可能不存在
+}}
+# 已由backfill_score.py预先计算且config未变的题目直接返回score，只有其余题目才传回config
+PROJ_DOC10 = {'$project': {
+    '_id': 1, 'docId': 1, 'title': 1, 'pid': 1,
+    'score': {'$cond': [SCORE_IS_FRESH, '$score', '$$REMOVE']},
+    'config': {'$cond': [SCORE_IS_FRESH, '$$REMOVE', '$config']}
+}}
+PROJ_RECORD = {'$project': {
+    '_id': {'$toString': '$_id'},
+    'status': 1,
+    'uid': 1,
+    'pid': 1,
+    'score': 1,
+    'judgeAt': mongo_format_datetime('$judgeAt') # judgeAt可能不存在
+}}
+PROJ_RECORD_BULK = {'$project': {**PROJ_RECORD['$project'], 'contest': {'$toString': '$contest'}}}
+SORT_BY_ID = {'$sort': {'_id': 1}}
+PROJ_USER = {'uname': 1, '_id': 1} #返回_id和uname，二者都在USER_INDEX中
+PROJ_USER_GROUP = {'_id': 1, 'name': 1, 'uids': 1}
+
+@functools.lru_cache(maxsize=8192)
+def config_score(config):
+    """
+    计算题目config（yaml格式字符串）中所有subtasks的score之和。
+    结果只取决于config内容，按config缓存，重复请求不再解析yaml。
+    config无法解析时返回None。
     """
-    mongo_host = os.environ.get('MONGO_HOST', 'oj-mongo')
-    mongo_port = int(os.environ.get('MONGO_PORT', '27017')) # 显式转换为整数，处理可能缺失的情况
     try:
-        client = pymongo.MongoClient(host=mongo_host, port=mongo_port, serverSelectionTimeoutMS=5000) #设置超时
-        client.admin.command('ping')  # 检查连接是否成功
-        return client
-    except pymongo.errors.ConnectionFailure as e:
-        print(f"Failed to connect to MongoDB: {e}")
-        raise  # 抛出异常，以便上层处理
+        config_data = yaml.load(config, Loader=YAML_LOADER)
+    except yaml.YAMLError as e:
+        print(f"Error parsing YAML config: {e}")
+        return None
+    total_score = 0
+    if config_data and 'subtasks' in config_data: # 检查 config_data 是否为 None
+        for subtask in config_data['subtasks']:
+            total_score += subtask.get('score', 0)  # 避免子任务中没有 'score' 字段的情况
+    return total_score
 
-def close_mongo_client(client):
+def problem_row(doc):
     """
-    关闭MongoDB客户端连接。
+    将docType为10的题目文档转换为返回数据，score为config中所有subtasks的score之和。
+    文档上已有预先计算的score时直接使用，否则解析config计算。
     """
-    if client:
-        client.close()
+    if 'score' in doc:
+        total_score = doc['score']
+    else:
+        total_score = config_score(doc['config']) if doc.get('config') else 0
+    if total_score is None:
+        # 处理 YAML 解析错误，例如，返回错误消息或跳过此文档
+        return {
+            '_id': str(doc['_id']),
+            'docId': doc['docId'],
+            'title': doc['title'],
+            'pid': doc['pid'],
+            "score": 0,
+            "error": "Invalid config format" # 可以添加一个错误标记
+        }
+    return {
+        '_id': str(doc['_id']),
+        'docId': doc['docId'],
+        'title': doc['title'],
+        'pid': doc['pid'],
+        "score": total_score
+    }
+
+# domainId到docType为10的返回结果的缓存，与RESPONSE_MAX_AGE一致
+PROBLEM_CACHE = TTLCache(maxsize=1024, ttl=RESPONSE_MAX_AGE)
+PROBLEM_CACHE_LOCK = threading.Lock() # TTLCache本身不是线程安全的
 
 @app.route('/hydro/document', methods=['GET'])
 def get_documents():
@@ -52,72 +297,45 @@ def get_documents():
     只返回对应数据的_id（ObjectId("")类型）,docId（数字）,title（文本）,pid（字符串）,
     config（字符串保存的yaml格式的文件）字段。
     """
-    client = None # 初始化client
     try:
-        client = get_mongo_client()
-        db = client.hydro
         domain_id = request.args.get('domainId')
-        doc_type = int(request.args.get('docType', 0)) # 增加docType参数，并提供默认值0
+        try:
+            doc_type = int(request.args.get('docType', 0)) # 增加docType参数，并提供默认值0
+        except ValueError:
+            doc_type = None
 
         if not domain_id:
             return jsonify({'error': 'domainId is required'}), 400
+        if doc_type not in (10, 30):
+            return jsonify({'error': 'Invalid docType'}), 400 # docType错误，返回400
 
+        # 参数校验通过后才访问数据库，非法请求不占用连接
+        client = get_mongo_client()
+        db = client.hydro
         if doc_type == 30:
-            documents = db.document.find(
-                {'domainId': domain_id, 'docType': 30},
-                {'_id': 1, 'docId': 1, 'title': 1, 'beginAt': 1, 'pids': 1}
-            )
-            result = [{
-                '_id': str(doc['_id']),
-                'docId': str(doc.get('docId')), # docId可能是ObjectId
-                'title': doc['title'],
-                'beginAt': format_datetime(doc.get('beginAt')), # beginAt可能不存在
-                'pids': ','.join(str(pid) for pid in doc.get('pids', []))  # pids可能不存在
-            } for doc in documents]
-        elif doc_type == 10:
-            documents = db.document.find(
-                {'domainId': domain_id, 'docType': 10},
-                {'_id': 1, 'docId': 1, 'title': 1, 'pid': 1, 'config': 1}
-            )
-            result = []
-            for doc in documents:
-                try:
-                    config_data = None
-                    if doc.get('config'):
-                        config_data = yaml.safe_load(doc['config'])
-                    total_score = 0
-                    if config_data and 'subtasks' in config_data: # 检查 config_data 是否为 None
-                        for subtask in config_data['subtasks']:
-                            total_score += subtask.get('score', 0)  # 避免子任务中没有 'score' 字段的情况
-                    result.append({
-                        '_id': str(doc['_id']),
-                        'docId': doc['docId'],
-                        'title': doc['title'],
-                        'pid': doc['pid'],
-                        "score": total_score
-                    })
-                except yaml.YAMLError as e:
-                    print(f"Error parsing YAML config: {e}")
-                    # 处理 YAML 解析错误，例如，返回错误消息或跳过此文档
-                    result.append({
-                        '_id': str(doc['_id']),
-                        'docId': doc['docId'],
-                        'title': doc['title'],
-                        'pid': doc['pid'],
-                        "score": 0,
-                        "error": "Invalid config format" # 可以添加一个错误标记
-                    })
-
-        else:
-            return jsonify({'error': 'Invalid docType'}), 400 # docType错误，返回400
+            # 返回的行直接由MongoDB按最终格式生成，无需在Python中逐条重建
+            result = db.document.aggregate([
+                {'$match': {'domainId': domain_id, 'docType': 30}},
+                PROJ_DOC30
+            ], batchSize=STREAM_BATCH_SIZE)
+            return stream_json(result)
 
-        return jsonify(result), 200
-    except pymongo.errors.ConnectionFailure:
+        with PROBLEM_CACHE_LOCK:
+            result = PROBLEM_CACHE.get(domain_id)
+        if result is None:
+            documents = db.document.aggregate([
+                {'$match': {'domainId': domain_id, 'docType': 10}},
+                PROJ_DOC10
+            ], batchSize=STREAM_BATCH_SIZE)
+            result = [problem_row(doc) for doc in documents]
+            with PROBLEM_CACHE_LOCK:
+                PROBLEM_CACHE[domain_id] = result
+        return cached_json(result)
+    except pymongo.errors.ConnectionFailure as e: # 包括第一次查询时未能选到服务器的ServerSelectionTimeoutError
+        print(f"Failed to connect to MongoDB: {e}")
         return jsonify({'error': 'Failed to connect to MongoDB'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        close_mongo_client(client)
 
 @app.route('/hydro/record', methods=['GET'])
 def get_records():
@@ -126,43 +344,118 @@ def get_records():
     返回集合中所有domainId和contest等于传入值的数据。
     只返回对应数据的_id（ObjectId("")类型）,status（数字）,uid（数字）,pid（数字）,score（数字）,
     judgeAt（ISODate("")类型）字段。
+    结果按_id升序返回。可选参数limit限制返回条数，after（ObjectId）只返回_id大于该值的记录：
+    分页时将上一页最后一条记录的_id作为after传入。
     """
-    client = None # 初始化
     try:
-        client = get_mongo_client()
-        db = client.hydro
         domain_id = request.args.get('domainId')
         contest_id_str = request.args.get('contest')
+        after_str = request.args.get('after')
+        limit_str = request.args.get('limit')
 
         if not domain_id:
             return jsonify({'error': 'domainId is required'}), 400
         if not contest_id_str:
             return jsonify({'error': 'contest is required'}), 400
 
-        try:
-            contest_id = ObjectId(contest_id_str)
-        except Exception:
+        if not OID_RE.fullmatch(contest_id_str):
             return jsonify({'error': 'Invalid contest ObjectId'}), 400
 
-        records = db.record.find(
-            {'domainId': domain_id, 'contest': contest_id},
-            {'_id': 1, 'status': 1, 'uid': 1, 'pid': 1, 'score': 1, 'judgeAt': 1}
-        )
-        result = [{
-            '_id': str(record['_id']),
-            'status': record['status'],
-            'uid': record['uid'],
-            'pid': record['pid'],
-            'score': record['score'],
-            'judgeAt': format_datetime(record.get('judgeAt')) # judgeAt可能不存在
-        } for record in records]
-        return jsonify(result), 200
-    except pymongo.errors.ConnectionFailure:
+        query = {'domainId': domain_id, 'contest': ObjectId(contest_id_str)}
+        if after_str:
+            if not OID_RE.fullmatch(after_str):
+                return jsonify({'error': 'Invalid after ObjectId'}), 400
+            query['_id'] = {'$gt': ObjectId(after_str)}
+        limit = 0 # 0表示不限制
+        if limit_str:
+            if not INT_RE.fullmatch(limit_str) or int(limit_str) == 0:
+                return jsonify({'error': 'limit must be a positive integer'}), 400
+            limit = int(limit_str)
+
+        client = get_mongo_client()
+        db = client.hydro
+        pipeline = [{'$match': query}, SORT_BY_ID]
+        if limit:
+            pipeline.append({'$limit': limit})
+        pipeline.append(PROJ_RECORD)
+        # 返回的行直接由MongoDB按最终格式生成，无需在Python中逐条重建
+        records = db.record.aggregate(pipeline, batchSize=RECORD_BATCH_SIZE)
+        return stream_json(records)
+    except pymongo.errors.ConnectionFailure as e: # 包括第一次查询时未能选到服务器的ServerSelectionTimeoutError
+        print(f"Failed to connect to MongoDB: {e}")
         return jsonify({'error': 'Failed to connect to MongoDB'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        close_mongo_client(client)
+
+@app.route('/hydro/record/bulk', methods=['POST'])
+def get_records_bulk():
+    """
+    6. 批量版的/hydro/record：请求体为JSON {"domainId": "...", "contests": ["<ObjectId>", ...]}，
+    一次查询返回所有比赛的记录，避免按比赛逐个请求。
+    返回字段与/hydro/record相同，另外附带contest（ObjectId字符串）以区分所属比赛。
+    contests最多包含BULK_MAX_ITEMS个。
+    """
+    try:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        domain_id = body.get('domainId')
+        contest_id_strs = body.get('contests')
+
+        if not domain_id:
+            return jsonify({'error': 'domainId is required'}), 400
+        if not isinstance(domain_id, str): # 请求体中的值可能是对象，直接放入查询会被当作操作符
+            return jsonify({'error': 'domainId must be a string'}), 400
+        if not isinstance(contest_id_strs, list) or not contest_id_strs:
+            return jsonify({'error': 'contests must be a non-empty list'}), 400
+        if len(contest_id_strs) > BULK_MAX_ITEMS:
+            return jsonify({'error': f'contests must contain at most {BULK_MAX_ITEMS} items'}), 400
+
+        if not all(isinstance(contest_id_str, str) and OID_RE.fullmatch(contest_id_str) for contest_id_str in contest_id_strs):
+            return jsonify({'error': 'Invalid contest ObjectId'}), 400
+        contest_ids = [ObjectId(contest_id_str) for contest_id_str in contest_id_strs]
+
+        client = get_mongo_client()
+        db = client.hydro
+        records = db.record.aggregate([
+            {'$match': {'domainId': domain_id, 'contest': {'$in': contest_ids}}},  # 使用$in操作符一次查询多个比赛
+            PROJ_RECORD_BULK
+        ], batchSize=RECORD_BATCH_SIZE)
+        return stream_json(records)
+    except pymongo.errors.ConnectionFailure as e: # 包括第一次查询时未能选到服务器的ServerSelectionTimeoutError
+        print(f"Failed to connect to MongoDB: {e}")
+        return jsonify({'error': 'Failed to connect to MongoDB'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# uid到uname的进程内缓存：uname极少变化，5分钟内的重复查询不再访问MongoDB
+UNAME_CACHE = TTLCache(maxsize=50_000, ttl=300)
+UNAME_CACHE_LOCK = threading.Lock() # TTLCache本身不是线程安全的
+
+def get_unames(db, user_ids):
+    """
+    返回 {_id: uname}，优先从UNAME_CACHE中读取，只对未命中的_id查询user集合。
+    不存在的用户不会出现在结果中。
+    """
+    unames = {}
+    missing_ids = []
+    with UNAME_CACHE_LOCK:
+        for user_id in user_ids:
+            uname = UNAME_CACHE.get(user_id)
+            if uname is None:
+                missing_ids.append(user_id)
+            else:
+                unames[user_id] = uname
+    if missing_ids:
+        users = db.user.find(
+            {'_id': {'$in': missing_ids}},  # 使用$in操作符查询多个ID
+            PROJ_USER
+        )
+        found = {user['_id']: user['uname'] for user in users}
+        with UNAME_CACHE_LOCK:
+            UNAME_CACHE.update(found)
+        unames.update(found)
+    return unames
 
 @app.route('/hydro/user', methods=['GET'])
 def get_user():
@@ -171,10 +464,7 @@ def get_user():
     返回集合中_id等于传入值的唯一数据。只返回对应数据的uname（字符串）字段。
     现在支持传入逗号分隔的_id列表，返回多个用户的信息。
     """
-    client = None
     try:
-        client = get_mongo_client()
-        db = client.hydro
         user_ids_str = request.args.get('_id')
 
         if not user_ids_str:
@@ -182,22 +472,51 @@ def get_user():
 
         user_ids = []
         for user_id_str in user_ids_str.split(','):
-            if not user_id_str.isdigit():
+            if not INT_RE.fullmatch(user_id_str):
                 return jsonify({'error': '_id must be an integer'}), 400
             user_ids.append(int(user_id_str))
 
-        users = list(db.user.find(
-            {'_id': {'$in': user_ids}},  # 使用$in操作符查询多个ID
-            {'uname': 1, '_id': 1} #返回_id和uname
-        ))
-        result = [{'_id':user['_id'],'uname': user['uname']} for user in users]
+        client = get_mongo_client()
+        db = client.hydro
+        unames = get_unames(db, user_ids)
+        result = [{'_id': user_id, 'uname': unames[user_id]} for user_id in dict.fromkeys(user_ids) if user_id in unames]
+        return cached_json(result)
+    except pymongo.errors.ConnectionFailure as e: # 包括第一次查询时未能选到服务器的ServerSelectionTimeoutError
+        print(f"Failed to connect to MongoDB: {e}")
+        return jsonify({'error': 'Failed to connect to MongoDB'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/hydro/user/bulk', methods=['POST'])
+def get_users_bulk():
+    """
+    7. 批量版的/hydro/user：请求体为JSON {"ids": [1, 2, 3, ...]}，
+    一次查询返回所有用户的uname，格式为 {"<_id>": "<uname>", ...}。
+    渲染排行榜时应收集全部uid后调用一次本接口，而不是按uid逐个请求/hydro/user。
+    ids最多包含BULK_MAX_ITEMS个，每个都必须是与/hydro/user相同范围内的非负整数。
+    """
+    try:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        user_ids = body.get('ids')
+
+        if not isinstance(user_ids, list) or not user_ids:
+            return jsonify({'error': 'ids must be a non-empty list'}), 400
+        if len(user_ids) > BULK_MAX_ITEMS:
+            return jsonify({'error': f'ids must contain at most {BULK_MAX_ITEMS} items'}), 400
+        if not all(isinstance(user_id, int) and not isinstance(user_id, bool) and 0 <= user_id < MAX_INT_ID for user_id in user_ids):
+            return jsonify({'error': 'ids must be integers'}), 400
+
+        client = get_mongo_client()
+        db = client.hydro
+        result = get_unames(db, user_ids)
         return jsonify(result), 200
-    except pymongo.errors.ConnectionFailure:
+    except pymongo.errors.ConnectionFailure as e: # 包括第一次查询时未能选到服务器的ServerSelectionTimeoutError
+        print(f"Failed to connect to MongoDB: {e}")
         return jsonify({'error': 'Failed to connect to MongoDB'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        close_mongo_client(client)
 
 @app.route('/hydro/user/group', methods=['GET'])
 def get_user_groups():
@@ -206,53 +525,32 @@ def get_user_groups():
     返回集合中所有domainId等于传入值的数据。只返回对应数据的_id（ObjectId("")类型）,
     name（文本）,uids（数字列表）字段。
     """
-    client = None
     try:
-        client = get_mongo_client()
-        db = client.hydro
         domain_id = request.args.get('domainId')
 
         if not domain_id:
             return jsonify({'error': 'domainId is required'}), 400
 
+        client = get_mongo_client()
+        db = client.hydro
         user_groups = db['user.group'].find( # 使用db[collection_name]的方式访问集合
             {'domainId': domain_id},
-            {'_id': 1, 'name': 1, 'uids': 1}
+            PROJ_USER_GROUP
         )
         result = [{
             '_id': str(group['_id']),
             'name': group['name'],
             'uids': ','.join(str(uid) for uid in group.get('uids', [])) # 确保返回一个列表，即使数据库中没有
         } for group in user_groups]
-        return jsonify(result), 200
-    except pymongo.errors.ConnectionFailure:
+        return cached_json(result)
+    except pymongo.errors.ConnectionFailure as e: # 包括第一次查询时未能选到服务器的ServerSelectionTimeoutError
+        print(f"Failed to connect to MongoDB: {e}")
         return jsonify({'error': 'Failed to connect to MongoDB'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        close_mongo_client(client)
 
 if __name__ == "__main__":
-    # 尝试从文件中加载配置
-    config_file = "config.yaml"
-    if os.path.exists(config_file):
-        try:
-            with open(config_file, 'r') as f:
-                config = yaml.safe_load(f)
-                if config: # 检查config是否为空
-                    # 更新MONGO_HOST和DOCKER_PORT，如果配置文件中有
-                    MONGO_HOST = config.get('mongo_host', os.environ.get('MONGO_HOST', 'oj-mongo'))
-                    DOCKER_PORT = config.get('docker_port', DOCKER_PORT)
-                    os.environ['MONGO_HOST'] = MONGO_HOST #设置环境变量
-                    print(f"Using MONGO_HOST from {config_file}: {MONGO_HOST}")
-                    print(f"Using DOCKER_PORT from {config_file}: {DOCKER_PORT}")
-        except yaml.YAMLError as e:
-            print(f"Error reading config file {config_file}: {e}")
-            # 不终止程序，继续使用环境变量或默认值
-        except Exception as e:
-            print(f"An unexpected error occurred while reading config file: {e}")
-    else:
-        print(f"Config file {config_file} not found, using environment variables or defaults.")
+    start_ensure_indexes()
     try:
         app.run(host='0.0.0.0', port=DOCKER_PORT) # 运行Flask应用
     except Exception as e:
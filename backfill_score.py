@@ -0,0 +1,43 @@
+"""
+预先计算docType为10的题目的总分，写回document集合的score字段。
+
+score与计算时使用的config一并保存（scoreConfig），/hydro/document在config未变时直接返回score，
+不再传回并解析yaml。Hydro修改题目config后，重新运行本脚本即可（只会更新config有变化的题目），
+未更新前接口会自动回退为解析config。
+
+用法: python backfill_score.py [domainId]
+"""
+import sys
+
+from pymongo import UpdateOne
+
+from app import DB, config_score
+
+BATCH_SIZE = 1000
+
+def backfill(domain_id=None):
+    query = {'docType': 10, '$expr': {'$ne': ['$config', '$scoreConfig']}}
+    if domain_id:
+        query['domainId'] = domain_id
+    updated = 0
+    skipped = 0
+    operations = []
+    for doc in DB.document.find(query, {'_id': 1, 'config': 1}).batch_size(BATCH_SIZE):
+        config = doc.get('config')
+        total_score = config_score(config) if config else 0
+        if total_score is None:
+            skipped += 1 # config无法解析，保持由接口返回错误标记
+            continue
+        operations.append(UpdateOne(
+            {'_id': doc['_id']},
+            {'$set': {'score': total_score, 'scoreConfig': config}}
+        ))
+        if len(operations) >= BATCH_SIZE:
+            updated += DB.document.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += DB.document.bulk_write(operations, ordered=False).modified_count
+    print(f"Updated score of {updated} problems, skipped {skipped} with invalid config")
+
+if __name__ == "__main__":
+    backfill(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+import sys
+
+import yaml
+
+# 与app.py保持一致：优先使用config.yaml中的docker_port，否则使用5000
+docker_port = 5000
+if os.path.exists("config.yaml"):
+    try:
+        with open("config.yaml", 'r') as f:
+            config = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+            if config:
+                docker_port = config.get('docker_port', docker_port)
+    except Exception as e:
+        print(f"Error reading config file config.yaml: {e}")
+
+bind = f"0.0.0.0:{docker_port}"
+
+# 接口都是MongoDB I/O密集型：gevent worker在等待MongoDB响应时切换到其他请求，
+# 单个worker即可同时处理上千个请求，共用进程内的连接池。
+# gunicorn会在加载app之前对worker进程执行monkey.patch_all()，PyMongo的socket和锁随之变为协程友好的实现；
+# 因此不要开启preload_app，否则app会在patch之前被导入。
+worker_class = "gevent"
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = 30
+
+def post_fork(server, worker):
+    """
+    worker进程fork之后重建MongoDB客户端。
+    只有在preload_app时app才会在fork前被导入，此时客户端不能跨进程共用。
+    """
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.reset_mongo_client()
+
+def post_worker_init(worker):
+    """
+    worker加载app之后，在后台创建接口查询所需的索引（失败时自动重试）。
+    """
+    sys.modules['app'].start_ensure_indexes()